@@ -12,8 +12,8 @@ def install_all(ctx: ArchBuilderContext, pacman: Pacman):
 	"""
 	packages = ctx.get("pacman.install", [])
 	if len(packages) <= 0: return
-	log.info("installing packages: %s", " ".join(packages))
-	pacman.install(packages)
+	log.info("queueing packages to install: %s", " ".join(packages))
+	pacman.queue_install(packages)
 
 
 def install_all_keyring(ctx: ArchBuilderContext, pacman: Pacman):
@@ -37,8 +37,8 @@ def uninstall_all(ctx: ArchBuilderContext, pacman: Pacman):
 	"""
 	packages = ctx.get("pacman.uninstall", [])
 	if len(packages) <= 0: return
-	log.info("uninstalling packages: %s", " ".join(packages))
-	pacman.uninstall(packages)
+	log.info("queueing packages to uninstall: %s", " ".join(packages))
+	pacman.queue_uninstall(packages)
 
 
 def append_config(ctx: ArchBuilderContext, lines: list[str]):
@@ -66,7 +66,7 @@ def gen_config(ctx: ArchBuilderContext, pacman: Pacman):
 	append_config(ctx, lines)
 	pacman.append_repos(lines, True)
 	with open_config(conf) as f:
-		f.writelines(lines)
+		f.write("".join(lines))
 	log.info(f"generated pacman config {conf}")
 
 
@@ -75,7 +75,9 @@ def proc_pacman(ctx: ArchBuilderContext, pacman: Pacman):
 	Install or remove packages for rootfs, and generate pacman.conf
 	"""
 	install_all(ctx, pacman)
+	pacman.flush_install()
 	uninstall_all(ctx, pacman)
+	pacman.flush_uninstall()
 	gen_config(ctx, pacman)
 
 
@@ -3,6 +3,11 @@ import pyalpm
 import logging
 import shutil
 import libarchive
+from operator import attrgetter, itemgetter
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
 from logging import getLogger
 from builder.lib.serializable import SerializableDict
 from builder.lib.context import ArchBuilderContext
@@ -11,6 +16,142 @@ from builder.lib.subscript import resolve_simple_values
 log = getLogger(__name__)
 
 
+# buffer size for extracting files from package archive
+EXTRACT_BUFFER = 1 << 20
+
+# files larger than this are extracted into a temporary file first
+EXTRACT_DIRECT_MAX = 4 << 20
+
+
+# options block template in generated pacman.conf
+CONFIG_OPTIONS = """\
+[options]
+{caches}\
+RootDir = {root}
+GPGDir = {gpgdir}
+LogFile = {logfile}
+HoldPkg = pacman glibc
+Architecture = {arch}
+UseSyslog
+Color
+CheckSpace
+VerbosePkgLists
+ParallelDownloads = {parallel}
+SigLevel = {siglevel}
+LocalFileSigLevel = Optional
+"""
+
+
+# shared http session, reuse connections between downloads
+_session = requests.Session()
+_adapter = HTTPAdapter(
+	pool_maxsize=8,
+	# only retry connecting, a slow server should fallback quickly
+	max_retries=Retry(total=3, connect=3, read=0, status=0, backoff_factor=1),
+)
+_session.mount("http://", _adapter)
+_session.mount("https://", _adapter)
+
+# seconds to wait for the preferred url before racing the others
+PREFERRED_DEADLINE = 5
+
+
+def _get(url: str) -> requests.Response:
+	"""
+	Start a streamed GET request, body is not read yet
+	"""
+	r = _session.get(url, stream=True, timeout=(10, 60))
+	try: r.raise_for_status()
+	except:
+		r.close()
+		raise
+	return r
+
+
+def _close_response(fut: Future):
+	if fut.cancelled() or fut.exception() is not None: return
+	fut.result().close()
+
+
+def _race(pool: ThreadPoolExecutor, pending: set[Future]) -> requests.Response:
+	"""
+	Wait for requests, return the first successful response
+	"""
+	winner, error = None, None
+	try:
+		while winner is None and len(pending) > 0:
+			done, pending = wait(pending, return_when=FIRST_COMPLETED)
+			for fut in done:
+				try: r = fut.result()
+				except Exception as e:
+					error = e
+					continue
+				if winner is None: winner = r
+				else: r.close()
+	finally:
+		# drop slower requests
+		for fut in pending:
+			fut.cancel()
+			fut.add_done_callback(_close_response)
+		pool.shutdown(wait=False)
+	if winner is None: raise error
+	log.debug(f"fastest response from {winner.url}")
+	return winner
+
+
+def fetch_fastest(urls: list[str]) -> requests.Response:
+	"""
+	Request all urls in parallel, return the first successful response
+	"""
+	if len(urls) == 1: return _get(urls[0])
+	pool = ThreadPoolExecutor(max_workers=len(urls))
+	return _race(pool, set(pool.submit(_get, url) for url in urls))
+
+
+def fetch_preferred(urls: list[str]) -> requests.Response:
+	"""
+	Request the first url, when it fails or does not respond in time,
+	race it with all other urls
+	"""
+	if len(urls) == 1: return _get(urls[0])
+	pool = ThreadPoolExecutor(max_workers=len(urls))
+	primary = pool.submit(_get, urls[0])
+	wait([primary], timeout=PREFERRED_DEADLINE)
+	if primary.done() and primary.exception() is None:
+		pool.shutdown(wait=False)
+		return primary.result()
+	if primary.done():
+		log.warning(f"download {urls[0]} failed ({primary.exception()}), try fallback urls")
+		pending = set()
+	else:
+		log.warning(f"download {urls[0]} too slow, try fallback urls")
+		pending = {primary}
+	pending.update(pool.submit(_get, url) for url in urls[1:])
+	return _race(pool, pending)
+
+
+def fetch_file(file: tuple[list[str], str]):
+	"""
+	Download a file (URLS, DEST) via shared http session
+	"""
+	urls, dest = file
+	log.debug(f"downloading {dest} from {' '.join(urls)}")
+	with fetch_preferred(urls) as r:
+		r.raw.decode_content = True
+		with open(dest, "wb") as f:
+			shutil.copyfileobj(r.raw, f)
+
+
+def fetch_files(files: list[tuple[list[str], str]]):
+	"""
+	Download files (URLS, DEST) in parallel via shared http session
+	When the first url fails, use the fastest of the other urls
+	"""
+	if len(files) <= 0: return
+	with ThreadPoolExecutor(max_workers=8) as pool:
+		list(pool.map(fetch_file, files))
+
+
 def log_cb(level, line):
 	if level & pyalpm.LOG_ERROR:
 		ll = logging.ERROR
@@ -32,20 +173,62 @@ def progress_cb(target, percent, n, i):
 	log.info(f"processing {target} ({i}/{n})")
 
 
+def extract_keyring(path: str, target: str) -> list[str]:
+	"""
+	Extract pacman keyring files from package archive into target
+	Return keyring names to populate
+	"""
+	names: list[str] = []
+	keyring_prefix = "usr/share/pacman/keyrings/"
+	prefix_len = len(keyring_prefix)
+
+	# open keyring package to extract
+	# data of skipped entries is never read by libarchive
+	with libarchive.file_reader(path) as archive:
+		for file in archive:
+			pn: str = file.pathname
+			if not pn.startswith(keyring_prefix): continue
+
+			# get the filename of file
+			fn = pn[prefix_len:]
+			if len(fn) <= 0: continue
+
+			# add keyring name to populate
+			if fn.endswith(".gpg"): names.append(fn[:-4])
+
+			# extract file, large file write into temporary file first
+			dest = os.path.join(target, fn)
+			log.debug(f"extracting {pn} to {dest}")
+			large = file.size > EXTRACT_DIRECT_MAX
+			out = f"{dest}.tmp" if large else dest
+			bs = min(file.size, EXTRACT_BUFFER) or EXTRACT_BUFFER
+			with open(out, "wb", buffering=EXTRACT_BUFFER) as f:
+				for block in file.get_blocks(bs):
+					f.write(block)
+				fd = f.fileno()
+				os.fchmod(fd, file.mode)
+				os.fchown(fd, file.uid, file.gid)
+			if large: os.rename(out, dest)
+	return names
+
+
 class PacmanRepoServer(SerializableDict):
 	url: str = None
 	name: str = None
 	mirror: bool = False
+	publickey_url: str = None
 
 	def __init__(
 		self,
 		name: str = None,
 		url: str = None,
-		mirror: bool = None
+		mirror: bool = None,
+		publickey_url: str = None
 	):
 		if url is not None: self.url = url
 		if name is not None: self.name = name
 		if mirror is not None: self.mirror = mirror
+		if publickey_url is not None: self.publickey_url = publickey_url
 
 
 class PacmanRepo(SerializableDict):
@@ -77,14 +260,29 @@ class PacmanRepo(SerializableDict):
 		self,
 		name: str = None,
 		url: str = None,
-		mirror: bool = None
+		mirror: bool = None,
+		publickey_url: str = None
 	):
 		self.servers.append(PacmanRepoServer(
 			name=name,
 			url=url,
 			mirror=mirror,
+			publickey_url=publickey_url,
 		))
 
+	def publickey_urls(self) -> list[str]:
+		"""
+		Get all candidate urls of public key, original url first
+		"""
+		urls: list[str] = []
+		if self.publickey is not None:
+			urls.append(self.publickey)
+		for server in self.servers:
+			url = server.publickey_url
+			if url is not None and url not in urls:
+				urls.append(url)
+		return urls
+
 
 class Pacman:
 	handle: pyalpm.Handle
@@ -94,92 +292,116 @@ class Pacman:
 	config: dict
 	caches: list[str]
 	repos: list[PacmanRepo]
+	_cache_index: dict[str, str] | None
+	_core_db: str
+	_config_path: str
+	_keyring_dir: str
+	_work_keyrings: str
+	_pending_install: dict[tuple[bool, bool, bool], dict[str, None]]
+	_pending_download: dict[str, None]
+	_pending_uninstall: dict[str, None]
 
 	def append_repos(self, lines: list[str], rootfs: bool = False):
 		"""
 		Add all databases into config
 		"""
 		for repo in self.repos:
-			lines.append(f"[{repo.name}]\n")
 			if rootfs and repo.mirrorlist is not None:
-				lines.append(f"Include = /etc/pacman.d/{repo.name}-mirrorlist\n")
-			else:
-				for server in repo.servers:
-					if server.mirror:
-						lines.append(f"# Mirror {server.name}\n")
-						log.debug(f"use mirror {server.name} url {server.url}")
-					else:
-						lines.append("# Original Repo\n")
-						log.debug(f"use original repo url {server.url}")
-					lines.append(f"Server = {server.url}\n")
+				lines.append(
+					f"[{repo.name}]\n"
+					f"Include = /etc/pacman.d/{repo.name}-mirrorlist\n"
+				)
+				continue
+			block = [f"[{repo.name}]"]
+			for server in repo.servers:
+				if server.mirror:
+					block.append(f"# Mirror {server.name}\nServer = {server.url}")
+					log.debug(f"use mirror {server.name} url {server.url}")
+				else:
+					block.append(f"# Original Repo\nServer = {server.url}")
+					log.debug(f"use original repo url {server.url}")
+			lines.append("\n".join(block) + "\n")
 
 	def append_config(self, lines: list[str]):
 		"""
 		Add basic pacman config for host
 		"""
-		siglevel = ("Required DatabaseOptional" if self.ctx.gpgcheck else "Never")
-		lines.append("[options]\n")
-		for cache in self.caches:
-			lines.append(f"CacheDir = {cache}\n")
-		lines.append(f"RootDir = {self.root}\n")
-		lines.append(f"GPGDir = {self.handle.gpgdir}\n")
-		lines.append(f"LogFile = {self.handle.logfile}\n")
-		lines.append("HoldPkg = pacman glibc\n")
-		lines.append(f"Architecture = {self.ctx.tgt_arch}\n")
-		lines.append("UseSyslog\n")
-		lines.append("Color\n")
-		lines.append("CheckSpace\n")
-		lines.append("VerbosePkgLists\n")
-		lines.append("ParallelDownloads = 5\n")
-		lines.append(f"SigLevel = {siglevel}\n")
-		lines.append("LocalFileSigLevel = Optional\n")
+		ctx, handle = self.ctx, self.handle
+		siglevel = ("Required DatabaseOptional" if ctx.gpgcheck else "Never")
+		lines.append(CONFIG_OPTIONS.format(
+			caches="".join(f"CacheDir = {cache}\n" for cache in self.caches),
+			root=self.root,
+			gpgdir=handle.gpgdir,
+			logfile=handle.logfile,
+			arch=ctx.tgt_arch,
+			parallel=max(5, len(self.repos)),
+			siglevel=siglevel,
+		))
 		self.append_repos(lines)
 
 	def init_keyring(self):
 		"""
 		Initialize pacman keyring
 		"""
-		path = os.path.join(self.ctx.work, "rootfs")
-		keyring = os.path.join(path, "etc/pacman.d/gnupg")
 		if not self.ctx.gpgcheck: return
-		if os.path.exists(os.path.join(keyring, "trustdb.gpg")):
+		if os.path.exists(os.path.join(self._keyring_dir, "trustdb.gpg")):
 			log.debug("skip initialize pacman keyring when exists")
 			return
 		log.info("initializing pacman keyring")
 		self.pacman_key(["--init"])
 
-		# Download and add public keys and mirrorlist
+		# Download all public keys and mirrorlist in parallel,
+		# public key fallback to mirrors when original url fails
+		files: list[tuple[list[str], str]] = []
+		mirrorlists = os.path.join(self.ctx.work, "etc/pacman.d")
+		os.makedirs(mirrorlists, mode=0o0755, exist_ok=True)
 		for repo in self.repos:
 			if repo.mirrorlist is not None:
-				mirrorlist = os.path.join(self.ctx.work, f"etc/pacman.d/{repo.name}-mirrorlist")
-				cmds = ["wget", repo.mirrorlist, "-O", keypath]
-				ret = self.ctx.run_external(cmds)
-				if ret != 0: raise OSError(f"wget failed with {ret}")
+				mirrorlist = os.path.join(mirrorlists, f"{repo.name}-mirrorlist")
+				files.append(([repo.mirrorlist], mirrorlist))
 			if repo.publickey is not None:
 				keypath = os.path.join(self.ctx.work, f"{repo.name}.pub")
-				cmds = ["wget", repo.publickey, "-O", keypath]
-				ret = self.ctx.run_external(cmds)
-				if ret != 0: raise OSError(f"wget failed with {ret}")
-				self.pacman_key(["--add", keypath])
-				self.lsign_key(repo.keyid)
+				files.append((repo.publickey_urls(), keypath))
+		fetch_files(files)
+
+		# Add all public keys and receive all key ids in one call each
+		keypaths: list[str] = []
+		keyids: list[str] = []
+		for repo in self.repos:
+			if repo.publickey is not None:
+				keypaths.append(os.path.join(self.ctx.work, f"{repo.name}.pub"))
 			elif repo.keyid is not None:
-				self.recv_keys(repo.keyid)
+				keyids.append(repo.keyid)
+		if len(keypaths) > 0:
+			self.pacman_key(["--add", *keypaths])
+		self.recv_keys(keyids)
+
+		# Local sign keys one by one
+		for repo in self.repos:
+			if repo.keyid is not None:
 				self.lsign_key(repo.keyid)
 
 	def init_config(self):
 		"""
 		Create host pacman.conf
 		"""
-		config = os.path.join(self.ctx.work, "pacman.conf")
+		config = self._config_path
+		lines: list[str] = []
+		self.append_config(lines)
+		data = "".join(lines).encode()
+
+		# skip rewrite when content not changed
 		if os.path.exists(config):
-			os.remove(config)
+			with open(config, "rb") as f:
+				if f.read() == data:
+					log.debug(f"pacman config {config} not changed")
+					return
+
 		log.info(f"generate pacman config {config}")
-		lines = []
-		self.append_config(lines)
-		log.debug("config content: %s", "\t".join(lines).strip())
+		log.debug("config content: %s", data.decode().strip().replace("\n", "\n\t"))
 		log.debug(f"writing {config}")
-		with open(config, "w") as f:
-			f.writelines(lines)
+		with open(config, "wb") as f:
+			f.write(data)
 
 	def pacman_key(self, args: list[str]):
 		"""
@@ -187,11 +409,9 @@ class Pacman:
 		"""
 		if not self.ctx.gpgcheck:
 			raise RuntimeError("GPG check disabled")
-		keyring = os.path.join(self.root, "etc/pacman.d/gnupg")
-		config = os.path.join(self.ctx.work, "pacman.conf")
 		cmds = ["pacman-key"]
-		cmds.append(f"--gpgdir={keyring}")
-		cmds.append(f"--config={config}")
+		cmds.append(f"--gpgdir={self._keyring_dir}")
+		cmds.append(f"--config={self._config_path}")
 		cmds.extend(args)
 		ret = self.ctx.run_external(cmds)
 		if ret != 0: raise OSError(f"pacman-key failed with {ret}")
@@ -200,11 +420,10 @@ class Pacman:
 		"""
 		Call pacman for rootfs
 		"""
-		config = os.path.join(self.ctx.work, "pacman.conf")
 		cmds = ["pacman"]
 		cmds.append("--noconfirm")
 		cmds.append(f"--root={self.root}")
-		cmds.append(f"--config={config}")
+		cmds.append(f"--config={self._config_path}")
 		cmds.extend(args)
 		ret = self.ctx.run_external(cmds)
 		if ret != 0: raise OSError(f"pacman failed with {ret}")
@@ -227,9 +446,8 @@ class Pacman:
 				servers.append(server.url)
 			db.servers = servers
 
-			# update database now via pyalpm
-			log.info(f"updating database {mirror.name}")
-			db.update(False)
+		# update all databases at once via pacman, which downloads
+		# them in parallel (a pyalpm handle updates databases serially)
 		self.init_config()
 		self.refresh()
 
@@ -285,12 +503,43 @@ class Pacman:
 		self.caches.append(root_cache)
 		os.makedirs(work_cache, mode=0o0755, exist_ok=True)
 		os.makedirs(root_cache, mode=0o0755, exist_ok=True)
+		self.index_cache()
+
+	def index_cache(self):
+		"""
+		Index all files in pacman cache folders by filename
+		"""
+		self._cache_index = {}
+		for cache in self.caches:
+			with os.scandir(cache) as it:
+				for entry in it:
+					# earlier cache folder take priority
+					self._cache_index.setdefault(entry.name, entry.path)
 
 	def add_repo(self, repo: PacmanRepo):
 		if not repo or not repo.name or len(repo.servers) <= 0:
 			raise ArchBuilderConfigError("bad repo")
 		self.repos.append(repo)
-		self.repos.sort(key=lambda r: r.priority)
+
+	def init_mirror_rules(self) -> list[tuple[str, str, str]]:
+		"""
+		Validate all mirrors and flatten rules as (ORIGINAL, NAME, MIRROR)
+		"""
+		rules: list[tuple[str, str, str]] = []
+		get_rule = itemgetter("original", "mirror")
+		for mirror in self.ctx.get("mirrors", []):
+			if "name" not in mirror:
+				raise ArchBuilderConfigError("mirror name not set")
+			if "repos" not in mirror:
+				raise ArchBuilderConfigError("repos list not set")
+			name = mirror["name"]
+			for rule in mirror["repos"]:
+				try: original, url = get_rule(rule)
+				except KeyError as e: raise ArchBuilderConfigError(
+					f"{e.args[0]} url not set"
+				)
+				rules.append((original, name, url))
+		return rules
 
 	def init_repos(self):
 		"""
@@ -298,7 +547,7 @@ class Pacman:
 		"""
 		if "repo" not in self.config:
 			raise ArchBuilderConfigError("no repos found in config")
-		mirrors = self.ctx.get("mirrors", [])
+		mirror_rules = self.init_mirror_rules()
 		for repo in self.config["repo"]:
 			if "name" not in repo:
 				raise ArchBuilderConfigError("repo name not set")
@@ -342,35 +591,35 @@ class Pacman:
 				}))
 
 			# add repo mirror url
-			for mirror in mirrors:
-				if "name" not in mirror:
-					raise ArchBuilderConfigError("mirror name not set")
-				if "repos" not in mirror:
-					raise ArchBuilderConfigError("repos list not set")
-				for repo in mirror["repos"]:
-					if "original" not in repo:
-						raise ArchBuilderConfigError("original url not set")
-					if "mirror" not in repo:
-						raise ArchBuilderConfigError("mirror url not set")
-					for original in originals:
-						if original.startswith(repo["original"]):
-							path = original[len(repo["original"]):]
-							real_url = repo["mirror"] + path
-							pacman_repo.add_server(
-								name=mirror["name"],
-								url=real_url,
-								mirror=True,
-							)
+			publickey = pacman_repo.publickey
+			for prefix, name, url in mirror_rules:
+				# public key on same mirror
+				mirror_key = None
+				if publickey is not None and publickey.startswith(prefix):
+					mirror_key = url + publickey[len(prefix):]
+				for original in originals:
+					if original.startswith(prefix):
+						path = original[len(prefix):]
+						pacman_repo.add_server(
+							name=name,
+							url=url + path,
+							mirror=True,
+							publickey_url=mirror_key,
+						)
 
 			# add original url
 			for original in originals:
 				pacman_repo.add_server(
 					url=original,
-					mirror=False
+					mirror=False,
+					publickey_url=publickey,
 				)
 
 			self.add_repo(pacman_repo)
 
+		# sort by priority once after all repos added
+		self.repos.sort(key=attrgetter("priority"))
+
 	def __init__(self, ctx: ArchBuilderContext):
 		"""
 		Initialize pacman context
@@ -380,35 +629,58 @@ class Pacman:
 			raise ArchBuilderConfigError("no pacman found in config")
 		self.config = ctx.config["pacman"]
 		self.root = ctx.get_rootfs()
+		self._core_db = os.path.join(self.root, "var/lib/pacman/sync/core.db")
+		self._config_path = os.path.join(self.ctx.work, "pacman.conf")
+		self._keyring_dir = os.path.join(self.root, "etc/pacman.d/gnupg")
+		self._work_keyrings = os.path.join(self.ctx.work, "keyrings")
 		db = os.path.join(self.root, "var/lib/pacman")
 		self.handle = pyalpm.Handle(self.root, db)
 		self.handle.arch = ctx.tgt_arch
 		self.handle.logfile = os.path.join(self.ctx.work, "pacman.log")
-		self.handle.gpgdir = os.path.join(self.root, "etc/pacman.d/gnupg")
+		self.handle.gpgdir = self._keyring_dir
 		self.handle.logcb = log_cb
 		self.handle.dlcb = dl_cb
 		self.handle.progresscb = progress_cb
 		self.databases = {}
 		self.caches = []
 		self.repos = []
+		self._cache_index = None
+		self._pending_install = {}
+		self._pending_download = {}
+		self._pending_uninstall = {}
 		self.init_cache()
 		self.init_repos()
 		for cache in self.caches:
 			self.handle.add_cachedir(cache)
 		self.init_config()
 
-	def uninstall(self, pkgs: list[str]):
+	def queue_uninstall(self, pkgs: list[str]):
 		"""
-		Uninstall packages via pacman
+		Queue packages to uninstall in next flush_uninstall
+		"""
+		self._pending_uninstall.update(dict.fromkeys(pkgs))
+
+	def flush_uninstall(self):
+		"""
+		Uninstall all queued packages via one pacman call
 		"""
+		pkgs = list(self._pending_uninstall)
 		if len(pkgs) == 0: return
+		self._pending_uninstall = {}
 		ps = " ".join(pkgs)
 		log.info(f"removing packages {ps}")
 		args = ["--needed", "--remove"]
 		args.extend(pkgs)
 		self.pacman(args)
 
-	def install(
+	def uninstall(self, pkgs: list[str]):
+		"""
+		Uninstall packages via pacman
+		"""
+		self.queue_uninstall(pkgs)
+		self.flush_uninstall()
+
+	def queue_install(
 		self,
 		pkgs: list[str],
 		/,
@@ -417,33 +689,75 @@ class Pacman:
 		nodeps: bool = False,
 	):
 		"""
-		Install packages via pacman
+		Queue packages to install in next flush_install
 		"""
 		if len(pkgs) == 0: return
-		core_db = "var/lib/pacman/sync/core.db"
-		if not os.path.exists(os.path.join(self.root, core_db)):
+		key = (force, asdeps, nodeps)
+		queue = self._pending_install.setdefault(key, {})
+		queue.update(dict.fromkeys(pkgs))
+
+	def flush_install(self):
+		"""
+		Install all queued packages via one pacman call per options
+		"""
+		pending = self._pending_install
+		if len(pending) == 0: return
+		self._pending_install = {}
+		if not os.path.exists(self._core_db):
 			self.refresh()
-		ps = " ".join(pkgs)
-		log.info(f"installing packages {ps}")
-		args = ["--sync"]
-		if not force: args.append("--needed")
-		if asdeps: args.append("--asdeps")
-		if nodeps: args.extend(["--nodeps", "--nodeps"])
-		args.extend(pkgs)
-		self.pacman(args)
+		for (force, asdeps, nodeps), queue in pending.items():
+			pkgs = list(queue)
+			ps = " ".join(pkgs)
+			log.info(f"installing packages {ps}")
+			args = ["--sync"]
+			if not force: args.append("--needed")
+			if asdeps: args.append("--asdeps")
+			if nodeps: args.extend(["--nodeps", "--nodeps"])
+			args.extend(pkgs)
+			self.pacman(args)
+		self.index_cache()
 
-	def download(self, pkgs: list[str]):
+	def install(
+		self,
+		pkgs: list[str],
+		/,
+		force: bool = False,
+		asdeps: bool = False,
+		nodeps: bool = False,
+	):
 		"""
-		Download packages via pacman
+		Install packages via pacman
+		"""
+		self.queue_install(pkgs, force=force, asdeps=asdeps, nodeps=nodeps)
+		self.flush_install()
+
+	def queue_download(self, pkgs: list[str]):
+		"""
+		Queue packages to download in next flush_download
+		"""
+		self._pending_download.update(dict.fromkeys(pkgs))
+
+	def flush_download(self):
+		"""
+		Download all queued packages via one pacman call
 		"""
+		pkgs = list(self._pending_download)
 		if len(pkgs) == 0: return
-		core_db = "var/lib/pacman/sync/core.db"
-		if not os.path.exists(os.path.join(self.root, core_db)):
+		self._pending_download = {}
+		if not os.path.exists(self._core_db):
 			self.refresh()
 		log.info("downloading packages %s", " ".join(pkgs))
 		args = ["--sync", "--downloadonly", "--nodeps", "--nodeps"]
 		args.extend(pkgs)
 		self.pacman(args)
+		self.index_cache()
+
+	def download(self, pkgs: list[str]):
+		"""
+		Download packages via pacman
+		"""
+		self.queue_download(pkgs)
+		self.flush_download()
 
 	def install_local(self, files: list[str]):
 		"""
@@ -464,16 +778,15 @@ class Pacman:
 		if force: args.append("--refresh")
 		self.pacman(args)
 
-	def recv_keys(self, keys: str | list[str]):
+	def recv_keys(self, keys: str | list[str] | tuple[str, ...]):
 		"""
 		Receive a key via pacman-key
 		"""
-		args = ["--recv-keys"]
-		if type(keys) is str:
-			args.append(keys)
-		elif type(keys) is list:
+		if isinstance(keys, str):
+			args = ["--recv-keys", keys]
+		elif isinstance(keys, (list, tuple)):
 			if len(keys) <= 0: return
-			args.extend(keys)
+			args = ["--recv-keys", *keys]
 		else: raise TypeError("bad keys type")
 		self.pacman_key(args)
 
@@ -485,17 +798,17 @@ class Pacman:
 
 	def pouplate_keys(
 		self,
-		names: str | list[str] = None,
+		names: str | list[str] | tuple[str, ...] = None,
 		folder: str = None
 	):
 		"""
 		Populate all keys via pacman-key
 		"""
 		args = ["--populate"]
-		if folder: args.extend(["--populate-from", folder])
+		if folder: args += ["--populate-from", folder]
 		if names is None: pass
-		elif type(names) is str: args.append(names)
-		elif type(names) is list: args.extend(names)
+		elif isinstance(names, str): args.append(names)
+		elif isinstance(names, (list, tuple)): args += names
 		else: raise TypeError("bad names type")
 		self.pacman_key(args)
 
@@ -503,66 +816,54 @@ class Pacman:
 		"""
 		Find out pacman package archive file in cache
 		"""
-		for cache in self.caches:
-			p = os.path.join(cache, pkg.filename)
-			if os.path.exists(p): return p
-		return None
+		if self._cache_index is None: self.index_cache()
+		return self._cache_index.get(pkg.filename)
 
-	def trust_keyring_pkg(self, pkg: pyalpm.Package):
+	def add_trust_keyring_pkg(self, pkgnames: list[str]):
 		"""
 		Trust a keyring package from file without install it
 		"""
 		if not self.ctx.gpgcheck: return
+		if len(pkgnames) <= 0: return
+		self.download(pkgnames)
 		names: list[str] = []
-		target = os.path.join(self.ctx.work, "keyrings")
-		keyring = "usr/share/pacman/keyrings/"
-
-		# find out file path
-		path = self.find_package_file(pkg)
+		target = self._work_keyrings
 
-		# cleanup keyring extract folder
+		# cleanup keyring extract folder once for all packages
 		if os.path.exists(target):
 			shutil.rmtree(target)
 		os.makedirs(target, mode=0o0755)
-		if path is None: raise RuntimeError(
-			f"package {pkg.name} not found"
-		)
-
-		# open keyring package to extract
-		log.debug(f"processing keyring package {pkg.name}")
-		with libarchive.file_reader(path) as archive:
-			for file in archive:
-				pn: str = file.pathname
-				if not pn.startswith(keyring): continue
-
-				# get the filename of file
-				fn = pn[len(keyring):]
-				if len(fn) <= 0: continue
-
-				# add keyring name to populate
-				if fn.endswith(".gpg"): names.append(fn[:-4])
-
-				# extract file
-				dest = os.path.join(target, fn)
-				log.debug(f"extracting {pn} to {dest}")
-				with open(dest, "wb") as f:
-					for block in file.get_blocks(file.size):
-						f.write(block)
-					fd = f.fileno()
-					os.fchmod(fd, file.mode)
-					os.fchown(fd, file.uid, file.gid)
-
-		# trust extracted keyring
-		self.pouplate_keys(names, target)
 
-	def add_trust_keyring_pkg(self, pkgnames: list[str]):
-		"""
-		Trust a keyring package from file without install it
-		"""
-		if not self.ctx.gpgcheck: return
-		if len(pkgnames) <= 0: return
-		self.download(pkgnames)
+		# resolve all package files first, pyalpm is not thread safe
+		files: dict[str, str] = {}
 		for pkgname in pkgnames:
-			pkgs = self.lookup_package(pkgname)
-			for pkg in pkgs:
-				self.trust_keyring_pkg(pkg)
+			for pkg in self.lookup_package(pkgname):
+				path = self.find_package_file(pkg)
+				if path is None: raise RuntimeError(
+					f"package {pkg.name} not found"
+				)
+				files[pkg.name] = path
+
+		# extract each keyring package into its own folder in parallel
+		staging = os.path.join(target, ".packages")
+		def extract(file: tuple[str, str]) -> list[str]:
+			name, path = file
+			folder = os.path.join(staging, name)
+			os.makedirs(folder, mode=0o0755)
+			log.debug(f"processing keyring package {name}")
+			return extract_keyring(path, folder)
+		try:
+			with ThreadPoolExecutor(max_workers=2) as pool:
+				for ret in pool.map(extract, files.items()):
+					names.extend(ret)
+
+			# merge keyrings in package order, then trust them in one call
+			for name in files:
+				folder = os.path.join(staging, name)
+				for fn in os.listdir(folder):
+					os.replace(os.path.join(folder, fn), os.path.join(target, fn))
+			shutil.rmtree(staging)
+			if len(names) > 0:
+				self.pouplate_keys(list(dict.fromkeys(names)), target)
+		finally:
+			shutil.rmtree(target, ignore_errors=True)